@@ -2,7 +2,7 @@
 PGL (Performance GPU Library) - high-performance GPU computing library.
 
 This library provides Triton-based high-performance GPU operator implementations
-and TorchScript model export for Java/C++ integration.
+and AOTInductor model export for C++ integration (legacy TorchScript export for Java).
 """
 
 # Import main APIs
@@ -2,7 +2,7 @@
 PGL ops package - implementations of all compute operators.
 """
 
-from .add import add, triton_add, pytorch_add
+from .add import add, triton_add, pytorch_add, fused_add, make_graphed_add, GraphedAdd
 from .export import export_torchscript_model, test_exported_model, TritonAddModule
 from .test import benchmark_add_operations, validate_correctness, print_system_info
 from .gtp import gtp_gpu, log10_multinomial_coeff, same_likelihood_terms, diff_likelihood_terms
@@ -12,6 +12,9 @@ __all__ = [
     'add',
     'triton_add', 
     'pytorch_add',
+    'fused_add',
+    'make_graphed_add',
+    'GraphedAdd',
     
     # Model export
     'export_torchscript_model',
@@ -3,7 +3,9 @@ Triton element-wise add operator implementation.
 Provides high-performance GPU addition.
 """
 
+import functools
 import logging
+from typing import Optional, Union
 
 import torch
 import triton
@@ -12,77 +14,387 @@ import triton.language as tl
 # Reduce Triton log noise
 logging.getLogger("triton").setLevel(logging.WARNING)
 
+# CUDA availability is fixed for the process; avoid the driver query per add() call
+_HAS_CUDA = torch.cuda.is_available()
+
+# Autotune search space for the memory-bound, persistent add_kernel.
+# Configs too small for one 128-bit access per thread are pruned per dtype.
+# num_stages 2-5 targets pipelining of the kernel loop; the gain is unverified.
+# Tuning is keyed per power-of-two size bucket (``n_bucket``), not per exact size.
+_ADD_CONFIGS = [
+    triton.Config({'BLOCK_SIZE': bs}, num_warps=w, num_stages=s)
+    for bs in (256, 512, 1024, 2048, 4096, 8192)
+    for w in (1, 2, 4, 8)
+    for s in (2, 3, 4, 5)
+]
+
+def _prune_unvectorizable(ptr_name: str):
+    """
+    Build an ``early_config_prune`` hook for autotuned add kernels.
+    
+    Keeps configs where every thread gets at least 16 bytes of ``ptr_name``'s
+    dtype (4 fp32 or 8 bf16/fp16 elements), the width of a 128-bit access.
+    """
+    def prune(configs, named_args, **kwargs):
+        per_thread = max(1, 16 // named_args[ptr_name].element_size())
+        kept = [c for c in configs if c.kwargs['BLOCK_SIZE'] >= c.num_warps * 32 * per_thread]
+        return kept or configs
+    return prune
+
+@triton.autotune(configs=_ADD_CONFIGS, key=['n_bucket'],
+                 prune_configs_by={'early_config_prune': _prune_unvectorizable('x_ptr')})
 @triton.jit
-def add_kernel(x_ptr, y_ptr, output_ptr, n_elements, BLOCK_SIZE: tl.constexpr):
+def add_kernel(x_ptr, y_ptr, output_ptr, n_elements, n_bucket, BLOCK_SIZE: tl.constexpr):
     """
-    Triton addition kernel.
+    Persistent Triton addition kernel.
+    
+    The grid is capped at a few programs per SM; each program strides over the
+    tensor in steps of ``num_programs * BLOCK_SIZE``.
     
     Args:
         x_ptr: Pointer to input tensor x
         y_ptr: Pointer to input tensor y
         output_ptr: Pointer to output tensor
         n_elements: Total number of elements
+        n_bucket: Autotune key, ``n_elements.bit_length()`` (unused in the body)
+        BLOCK_SIZE: Block size (compile-time constant, chosen by autotune)
+    """
+    pid = tl.program_id(axis=0)
+    num_pids = tl.num_programs(axis=0)
+    for block_start in range(pid * BLOCK_SIZE, n_elements, num_pids * BLOCK_SIZE):
+        offsets = block_start + tl.arange(0, BLOCK_SIZE)
+        # Alignment/contiguity hints so loads/stores are emitted as vector ops
+        offsets = tl.max_contiguous(tl.multiple_of(offsets, BLOCK_SIZE), BLOCK_SIZE)
+        mask = offsets < n_elements
+        
+        # Load data
+        x = tl.load(x_ptr + offsets, mask=mask, other=0.0)
+        y = tl.load(y_ptr + offsets, mask=mask, other=0.0)
+        
+        # Compute
+        output = x + y
+        
+        # Store result (cast to the output dtype, e.g. bf16/fp16 for reduced precision)
+        tl.store(output_ptr + offsets, output.to(output_ptr.dtype.element_ty), mask=mask)
+
+# Maximum rank handled by add_kernel_strided; higher ranks are copied to contiguous
+_MAX_STRIDED_DIMS = 4
+_STRIDED_BLOCK_SIZE = 1024
+
+@triton.jit
+def add_kernel_strided(x_ptr, y_ptr, output_ptr, n_elements,
+                       size1, size2, size3,
+                       sx0, sx1, sx2, sx3,
+                       sy0, sy1, sy2, sy3,
+                       BLOCK_SIZE: tl.constexpr):
+    """
+    Triton addition kernel for non-contiguous inputs (up to 4-D).
+    
+    Args:
+        x_ptr: Pointer to input tensor x
+        y_ptr: Pointer to input tensor y
+        output_ptr: Pointer to contiguous output tensor
+        n_elements: Total number of elements
+        size1..size3: Sizes of dims 1-3 (shape left-padded with 1s to 4-D)
+        sx0..sx3: Element strides of x
+        sy0..sy3: Element strides of y
         BLOCK_SIZE: Block size (compile-time constant)
     """
     pid = tl.program_id(axis=0)
-    block_start = pid * BLOCK_SIZE
-    offsets = block_start + tl.arange(0, BLOCK_SIZE)
+    offsets = pid * BLOCK_SIZE + tl.arange(0, BLOCK_SIZE)
     mask = offsets < n_elements
     
-    # Load data
-    x = tl.load(x_ptr + offsets, mask=mask, other=0.0)
-    y = tl.load(y_ptr + offsets, mask=mask, other=0.0)
+    # Unravel the row-major output index into 4-D coordinates
+    i3 = offsets % size3
+    rest = offsets // size3
+    i2 = rest % size2
+    rest = rest // size2
+    i1 = rest % size1
+    i0 = rest // size1
+    
+    x = tl.load(x_ptr + i0 * sx0 + i1 * sx1 + i2 * sx2 + i3 * sx3, mask=mask, other=0.0)
+    y = tl.load(y_ptr + i0 * sy0 + i1 * sy1 + i2 * sy2 + i3 * sy3, mask=mask, other=0.0)
     
-    # Compute
     output = x + y
+    tl.store(output_ptr + offsets, output.to(output_ptr.dtype.element_ty), mask=mask)
+
+def _launch_strided(x: torch.Tensor, y: torch.Tensor, out: torch.Tensor) -> torch.Tensor:
+    """Launch ``add_kernel_strided`` for inputs of rank <= _MAX_STRIDED_DIMS."""
+    pad = _MAX_STRIDED_DIMS - x.dim()
+    shape = (1, ) * pad + tuple(x.shape)
+    x_strides = (0, ) * pad + x.stride()
+    y_strides = (0, ) * pad + y.stride()
+    n_elements = out.numel()
+    grid = (triton.cdiv(n_elements, _STRIDED_BLOCK_SIZE), )
+    add_kernel_strided[grid](x, y, out, n_elements, *shape[1:], *x_strides, *y_strides,
+                             BLOCK_SIZE=_STRIDED_BLOCK_SIZE)
+    return out
+
+# Resident programs per SM for the persistent add_kernel
+_PROGRAMS_PER_SM = 4
+
+@functools.cache
+def _num_sms(device: torch.device) -> int:
+    """Streaming multiprocessor count of a CUDA device (cached)."""
+    return torch.cuda.get_device_properties(device).multi_processor_count
+
+# Distinct (n_elements, device) launch parameter sets kept by _launch_params
+_LAUNCH_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=_LAUNCH_CACHE_SIZE)
+def _launch_params(n_elements: int, device: torch.device):
+    """
+    Size bucket and launch grid for a given element count, cached per (n_elements, device).
+    
+    Returns:
+        Tuple[int, Callable]: (n_bucket, grid)
+    """
+    max_programs = _num_sms(device) * _PROGRAMS_PER_SM
+    
+    def grid(META):
+        return (max(1, min(max_programs, triton.cdiv(n_elements, META['BLOCK_SIZE']))), )
+    
+    return n_elements.bit_length(), grid
+
+def _triton_add_unchecked(x: torch.Tensor, y: torch.Tensor, out: torch.Tensor) -> torch.Tensor:
+    """
+    Launch the add kernel without any validation.
+    
+    Callers must pass CUDA tensors of identical shape and dtype and a contiguous ``out``.
+    Contiguous inputs use the flat ``add_kernel``; strided ones use
+    ``add_kernel_strided`` instead of being copied.
+    """
+    if not (x.is_contiguous() and y.is_contiguous()):
+        if x.dim() <= _MAX_STRIDED_DIMS:
+            return _launch_strided(x, y, out)
+        x = x.contiguous()
+        y = y.contiguous()
+    n_elements = x.numel()
+    n_bucket, grid = _launch_params(n_elements, x.device)
+    add_kernel[grid](x, y, out, n_elements, n_bucket)
+    return out
+
+def _can_use_triton(x: torch.Tensor, y: torch.Tensor) -> bool:
+    """Whether ``x`` and ``y`` satisfy the Triton kernel's preconditions."""
+    return x.is_cuda and y.is_cuda and x.shape == y.shape and x.dtype == y.dtype
+
+# Output dtypes accepted by add(dtype=...) and for ``out`` with floating-point inputs
+_REDUCED_DTYPES = (torch.bfloat16, torch.float16)
+
+def _is_valid_out(out: torch.Tensor, x: torch.Tensor) -> bool:
+    """
+    Whether ``out`` can receive the Triton kernel's result for input ``x``.
     
-    # Store result
-    tl.store(output_ptr + offsets, output, mask=mask)
+    ``out`` must be contiguous with the input shape and device, and have the input
+    dtype (or bf16/fp16 for floating-point inputs); other dtypes would be silently
+    truncated by the kernel's store cast.
+    """
+    dtype_ok = out.dtype == x.dtype or (x.is_floating_point() and out.dtype in _REDUCED_DTYPES)
+    return dtype_ok and out.shape == x.shape and out.device == x.device and out.is_contiguous()
 
-def triton_add(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+def triton_add(x: torch.Tensor, y: torch.Tensor,
+               out: Optional[torch.Tensor] = None) -> torch.Tensor:
     """
     Run tensor addition with the Triton kernel.
     
     Args:
         x: Input tensor 1
         y: Input tensor 2
+        out: Optional preallocated contiguous output tensor, reused across calls. Its
+            dtype must equal the input dtype, or be bf16/fp16 for floating-point inputs.
         
     Returns:
-        torch.Tensor: Result tensor
+        torch.Tensor: Result tensor (``out`` when given)
         
     Raises:
-        AssertionError: If shapes differ or tensors are not on CUDA
+        AssertionError: If shapes differ, tensors are not on CUDA or ``out`` is unusable
     """
     assert x.shape == y.shape, "Input tensor shapes must match"
     assert x.is_cuda and y.is_cuda, "Input tensors must be on CUDA"
     assert x.dtype == y.dtype, "Input tensor dtypes must match"
     
-    output = torch.empty_like(x)
-    n_elements = output.numel()
+    if out is None:
+        out = torch.empty(x.shape, dtype=x.dtype, device=x.device)
+    else:
+        assert _is_valid_out(out, x), \
+            "Output tensor must be contiguous with the input shape, device and a compatible dtype"
+    return _triton_add_unchecked(x, y, out)
+
+class GraphedAdd:
+    """
+    ``triton_add`` captured in a CUDA graph for repeated same-shape calls.
+    
+    Replaying the graph skips the per-call Python and Triton launch overhead,
+    which dominates for small tensors.
+    
+    Attributes:
+        inputs: Captured input buffers ``(x, y)``; passing them back in skips the copies
+        output: Captured output buffer, overwritten by every call
+    """
+    
+    def __init__(self, shape, dtype: torch.dtype = torch.float32,
+                 device: Union[str, torch.device] = "cuda"):
+        device = torch.device(device)
+        with torch.cuda.device(device):
+            static_x = torch.zeros(shape, dtype=dtype, device=device)
+            static_y = torch.zeros(shape, dtype=dtype, device=device)
+            static_out = torch.empty(shape, dtype=dtype, device=device)
+            
+            # Warm up on a side stream so autotuning and JIT compilation stay out of the capture
+            side_stream = torch.cuda.Stream()
+            side_stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(side_stream):
+                for _ in range(3):
+                    triton_add(static_x, static_y, out=static_out)
+            torch.cuda.current_stream().wait_stream(side_stream)
+            
+            self._graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(self._graph):
+                triton_add(static_x, static_y, out=static_out)
+        
+        self.inputs = (static_x, static_y)
+        self.output = static_out
+    
+    def __call__(self, x_src: torch.Tensor, y_src: torch.Tensor) -> torch.Tensor:
+        """
+        Copy the inputs into the captured buffers and replay the graph.
+        
+        Returns:
+            torch.Tensor: The captured output buffer (reused across calls)
+        """
+        static_x, static_y = self.inputs
+        if x_src is not static_x:
+            static_x.copy_(x_src)
+        if y_src is not static_y:
+            static_y.copy_(y_src)
+        self._graph.replay()
+        return self.output
+
+def make_graphed_add(shape, dtype: torch.dtype = torch.float32,
+                     device: Union[str, torch.device] = "cuda") -> GraphedAdd:
+    """
+    Capture ``triton_add`` in a CUDA graph for repeated same-shape calls.
+    
+    Args:
+        shape: Shape of the input tensors
+        dtype: Input tensor dtype
+        device: CUDA device; warmup and capture run on it even if it is not current
+        
+    Returns:
+        GraphedAdd: Callable ``run(x_src, y_src)`` that copies the inputs into the
+        captured buffers, replays the graph and returns the (reused) output buffer
+    """
+    return GraphedAdd(shape, dtype, device)
+
+# Maximum number of inputs summed by a single fused_add_kernel launch
+_FUSED_MAX_INPUTS = 4
+
+# fused_add_kernel has no loop for the software pipeliner, so num_stages is not swept
+_FUSED_ADD_CONFIGS = [
+    triton.Config({'BLOCK_SIZE': bs}, num_warps=w)
+    for bs in (256, 512, 1024, 2048, 4096, 8192)
+    for w in (1, 2, 4, 8)
+]
+
+@triton.autotune(configs=_FUSED_ADD_CONFIGS, key=['n_bucket', 'K'],
+                 prune_configs_by={'early_config_prune': _prune_unvectorizable('x0_ptr')})
+@triton.jit
+def fused_add_kernel(x0_ptr, x1_ptr, x2_ptr, x3_ptr, output_ptr, n_elements, n_bucket,
+                     K: tl.constexpr, BLOCK_SIZE: tl.constexpr):
+    """
+    Triton kernel summing up to four inputs in registers.
+    
+    Args:
+        x0_ptr..x3_ptr: Pointers to input tensors (only the first K are read)
+        output_ptr: Pointer to output tensor
+        n_elements: Total number of elements
+        n_bucket: Autotune key, ``n_elements.bit_length()`` (unused in the body)
+        K: Number of inputs to sum (compile-time constant, 1..4)
+        BLOCK_SIZE: Block size (compile-time constant, chosen by autotune)
+    """
+    pid = tl.program_id(axis=0)
+    block_start = pid * BLOCK_SIZE
+    offsets = block_start + tl.arange(0, BLOCK_SIZE)
+    offsets = tl.max_contiguous(tl.multiple_of(offsets, BLOCK_SIZE), BLOCK_SIZE)
+    mask = offsets < n_elements
+    
+    # Accumulate in registers; unused branches are removed at compile time
+    acc = tl.load(x0_ptr + offsets, mask=mask, other=0.0)
+    if K > 1:
+        acc += tl.load(x1_ptr + offsets, mask=mask, other=0.0)
+    if K > 2:
+        acc += tl.load(x2_ptr + offsets, mask=mask, other=0.0)
+    if K > 3:
+        acc += tl.load(x3_ptr + offsets, mask=mask, other=0.0)
+    
+    # Single store for all inputs
+    tl.store(output_ptr + offsets, acc, mask=mask)
+
+def fused_add(*tensors: torch.Tensor) -> torch.Tensor:
+    """
+    Sum any number of tensors with as few kernel launches as possible.
+    
+    Up to four inputs are summed per launch, so ``fused_add(a, b, c)`` moves
+    4N elements instead of the 6N of two chained ``triton_add`` calls.
+    
+    Args:
+        *tensors: Input tensors (same shape, dtype, CUDA device)
+        
+    Returns:
+        torch.Tensor: Element-wise sum of all inputs
+        
+    Raises:
+        AssertionError: If no inputs are given, shapes/dtypes differ or tensors are not on CUDA
+    """
+    assert len(tensors) > 0, "At least one input tensor is required"
+    first = tensors[0]
+    for t in tensors:
+        assert t.shape == first.shape, "Input tensor shapes must match"
+        assert t.is_cuda, "Input tensors must be on CUDA"
+        assert t.dtype == first.dtype, "Input tensor dtypes must match"
     
-    # Grid size
-    BLOCK_SIZE = 1024
-    grid = (triton.cdiv(n_elements, BLOCK_SIZE), )
+    pending = [t.contiguous() for t in tensors]
+    n_elements = first.numel()
+    n_bucket = n_elements.bit_length()
     
-    # Launch kernel
-    add_kernel[grid](x, y, output, n_elements, BLOCK_SIZE=1024)
+    def grid(META):
+        return (triton.cdiv(n_elements, META['BLOCK_SIZE']), )
     
-    return output
+    output = torch.empty_like(pending[0])
+    while True:
+        chunk = pending[:_FUSED_MAX_INPUTS]
+        k = len(chunk)
+        # Pad unused pointer slots; they are never read for K < 4
+        ptrs = chunk + [chunk[0]] * (_FUSED_MAX_INPUTS - k)
+        fused_add_kernel[grid](*ptrs, output, n_elements, n_bucket, K=k)
+        if len(pending) <= _FUSED_MAX_INPUTS:
+            return output
+        # Carry the partial sum into the next launch and accumulate in place; each
+        # element is read and written by the same program, so aliasing is safe
+        pending = [output] + pending[_FUSED_MAX_INPUTS:]
 
-def pytorch_add(x: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+def pytorch_add(x: torch.Tensor, y: torch.Tensor,
+                out: Optional[torch.Tensor] = None) -> torch.Tensor:
     """
     Tensor addition via native PyTorch (for comparison and fallback).
     
     Args:
         x: Input tensor 1
         y: Input tensor 2
+        out: Optional preallocated output tensor
         
     Returns:
         torch.Tensor: Result tensor
     """
-    return torch.add(x, y)
+    return torch.add(x, y, out=out)
+
+def _is_broadcast_scalar(t: torch.Tensor) -> bool:
+    """Whether every element of ``t`` aliases a single value (each dim has stride 0 or size 1)."""
+    return t.numel() > 0 and all(st == 0 or sz == 1 for sz, st in zip(t.shape, t.stride()))
 
-def add(x: torch.Tensor, y: torch.Tensor, use_triton: bool = True) -> torch.Tensor:
+def add(x: torch.Tensor, y: torch.Tensor, use_triton: bool = True,
+        dtype: Optional[torch.dtype] = None,
+        out: Optional[torch.Tensor] = None) -> torch.Tensor:
     """
     Smart add: pick the best available implementation.
     
@@ -90,16 +402,42 @@ def add(x: torch.Tensor, y: torch.Tensor, use_triton: bool = True) -> torch.Tens
         x: Input tensor 1
         y: Input tensor 2
         use_triton: Prefer Triton when CUDA is available
+        dtype: Optional reduced-precision output dtype (torch.bfloat16 or torch.float16).
+            The sum is computed in the input dtype and rounded on store, so bf16/fp16
+            inputs move half the bytes of fp32 and fp32 inputs still save on the write.
+            When ``out`` is also given, ``out.dtype`` must equal ``dtype``.
+        out: Optional preallocated output tensor, reused across calls. The Triton path
+            is used only if ``out`` is contiguous, matches the input shape/device and has
+            the input dtype (or bf16/fp16 for floating-point inputs); otherwise the call
+            goes to ``torch.add(..., out=out)``, which applies PyTorch's casting rules.
         
     Returns:
-        torch.Tensor: Result tensor
+        torch.Tensor: Result tensor (``out`` when given)
+        
+    Raises:
+        ValueError: If dtype is not None, torch.bfloat16 or torch.float16, or differs from ``out.dtype``
     """
-    if use_triton and x.is_cuda and y.is_cuda and torch.cuda.is_available():
-        try:
-            return triton_add(x, y)
-        except Exception as e:
-            logging.warning(f"Triton add failed, falling back to PyTorch: {e}")
-            return pytorch_add(x, y)
-    else:
-        return pytorch_add(x, y)
-
+    if dtype is not None and dtype not in _REDUCED_DTYPES:
+        raise ValueError(f"dtype must be torch.bfloat16 or torch.float16, got {dtype}")
+    if dtype is not None and out is not None and out.dtype != dtype:
+        raise ValueError(f"out dtype {out.dtype} does not match dtype {dtype}")
+    
+    if (use_triton and _HAS_CUDA and _can_use_triton(x, y)
+            and (out is None or _is_valid_out(out, x))):
+        # Constant operand: fold it to a 0-d view so PyTorch reads one element instead of N
+        if _is_broadcast_scalar(x):
+            x = x.as_strided((), ())
+        elif _is_broadcast_scalar(y):
+            y = y.as_strided((), ())
+        else:
+            try:
+                if out is None:
+                    out = torch.empty(x.shape, dtype=dtype or x.dtype, device=x.device)
+                return _triton_add_unchecked(x, y, out)
+            except Exception as e:
+                logging.warning(f"Triton add failed, falling back to PyTorch: {e}")
+    
+    if out is not None:
+        return pytorch_add(x, y, out=out)
+    result = pytorch_add(x, y)
+    return result if dtype is None else result.to(dtype)
@@ -1,8 +1,10 @@
 """
-Model export module - unified TorchScript model export.
+Model export module - AOTInductor model export (TorchScript kept as legacy option).
 """
 
 import logging
+from typing import Optional
+
 import torch
 from .add import pytorch_add
 
@@ -15,8 +17,9 @@ def setup_logging():
 
 class TritonAddModule(torch.nn.Module):
     """
-    Triton add module exportable as TorchScript.
-    Note: Triton kernels cannot be serialized directly; PyTorch ops are used here instead.
+    Add module exportable for C++ (AOTInductor) or Java/C++ (legacy TorchScript) use.
+    Note: hand-written Triton kernels cannot be serialized directly; the module
+    uses PyTorch ops, which AOTInductor lowers to its own generated Triton kernel.
     """
     
     def __init__(self):
@@ -35,51 +38,105 @@ class TritonAddModule(torch.nn.Module):
         """
         return pytorch_add(x, y)
 
-def export_torchscript_model(output_path: str = "triton_add_model.pt", 
-                           use_trace: bool = True) -> torch.jit.ScriptModule:
+def _export_device() -> torch.device:
+    """Device the exported model is compiled for."""
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Model file suffix written by each export mode
+_AOT_SUFFIX = ".so"
+_TRACE_SUFFIX = ".pt"
+
+def _resolve_model_path(model_path: Optional[str], use_trace: bool) -> str:
     """
-    Export a TorchScript model for Java/C++ use.
+    Default the model path for the export mode and check its suffix.
+    
+    Raises:
+        ValueError: If the suffix does not match the mode (``.so`` for AOTInductor, ``.pt`` for trace)
+    """
+    suffix = _TRACE_SUFFIX if use_trace else _AOT_SUFFIX
+    if model_path is None:
+        return "triton_add_model" + suffix
+    if not model_path.endswith(suffix):
+        mode = "TorchScript trace" if use_trace else "AOTInductor"
+        raise ValueError(f"{mode} model path must end with '{suffix}', got: {model_path}")
+    return model_path
+
+def _load_exported_model(model_path: str, device: torch.device, use_trace: bool):
+    """Load a model written by ``export_torchscript_model`` in the given mode."""
+    if not use_trace:
+        return torch._export.aot_load(model_path, device.type)
+    return torch.jit.load(model_path)
+
+def export_torchscript_model(output_path: Optional[str] = None, 
+                           use_trace: bool = False):
+    """
+    Export the add model for native use.
+    
+    By default the model is compiled ahead of time with AOTInductor for CUDA when
+    available, else CPU. The shared library embeds the generated kernel (Triton on
+    CUDA, C++ on CPU) and is a C++-only artifact: load a CUDA build with
+    ``torch::inductor::AOTIModelContainerRunnerCuda`` and a CPU build with
+    ``torch::inductor::AOTIModelContainerRunnerCpu``. Only the legacy TorchScript
+    ``.pt`` (``use_trace=True``) can be loaded from Java.
     
     Args:
-        output_path: Output model file path
-        use_trace: Use trace mode (otherwise script mode)
+        output_path: Output model file path; defaults to ``triton_add_model.so``
+            (AOTInductor) or ``triton_add_model.pt`` (trace)
+        use_trace: Export a TorchScript trace instead (legacy path). The module is
+            frozen with ``torch.jit.optimize_for_inference`` before saving. With
+            the default profiling executor, the first call for each new input
+            shape re-runs JIT optimization; loaders that feed varying shapes
+            should call ``torch._C._jit_set_profiling_executor(False)`` before
+            ``torch.jit.load``. That setting is process-wide, so it is left to
+            the caller.
         
     Returns:
-        torch.jit.ScriptModule: Exported model
+        Exported model: loaded AOTInductor runner, or torch.jit.ScriptModule when use_trace=True
+        
+    Raises:
+        ValueError: If ``output_path`` has the wrong suffix for the export mode
     """
     setup_logging()
     logger = logging.getLogger(__name__)
-    
-    logger.info("Starting TorchScript model export...")
+    output_path = _resolve_model_path(output_path, use_trace)
     
     # Create model instance
     model = TritonAddModule()
     model.eval()
+    device = torch.device("cpu") if use_trace else _export_device()
     
     try:
+        example_x = torch.randn(1000, dtype=torch.float32, device=device)
+        example_y = torch.randn(1000, dtype=torch.float32, device=device)
+        
         if use_trace:
-            # Trace mode
-            logger.info("Exporting with trace mode...")
-            example_x = torch.randn(1000, dtype=torch.float32)
-            example_y = torch.randn(1000, dtype=torch.float32)
+            # Legacy TorchScript trace mode
+            logger.info("Exporting TorchScript model with trace mode...")
             traced_model = torch.jit.trace(model, (example_x, example_y))
-            scripted_model = traced_model
+            # Freeze (inline parameters/attributes as constants) and apply inference-only graph
+            # passes; per-shape profiling-executor re-optimization on load still applies
+            exported_model = torch.jit.optimize_for_inference(traced_model)
+            logger.info(f"Saving model to: {output_path}")
+            exported_model.save(output_path)
         else:
-            # Script mode
-            logger.info("Exporting with script mode...")
-            scripted_model = torch.jit.script(model)
-        
-        # Save model
-        logger.info(f"Saving model to: {output_path}")
-        scripted_model.save(output_path)
+            # AOTInductor; keep the element count dynamic so one library serves all sizes
+            logger.info(f"Compiling model with AOTInductor for {device.type}...")
+            n_elements = torch.export.Dim("n_elements")
+            output_path = torch._export.aot_compile(
+                model,
+                (example_x, example_y),
+                dynamic_shapes={"x": {0: n_elements}, "y": {0: n_elements}},
+                options={"aot_inductor.output_path": output_path},
+            )
+            logger.info(f"Saved model to: {output_path}")
         
         # Validate model
         logger.info("Validating model...")
-        loaded_model = torch.jit.load(output_path)
+        loaded_model = _load_exported_model(output_path, device, use_trace)
         
         # Test data
-        test_x = torch.randn(100, dtype=torch.float32)
-        test_y = torch.randn(100, dtype=torch.float32)
+        test_x = torch.randn(100, dtype=torch.float32, device=device)
+        test_y = torch.randn(100, dtype=torch.float32, device=device)
         
         # Run model
         with torch.no_grad():
@@ -92,8 +149,8 @@ def export_torchscript_model(output_path: str = "triton_add_model.pt",
         else:
             logger.warning("✗ Model validation failed - results differ")
             
-        logger.info("✓ TorchScript model export complete")
-        return scripted_model
+        logger.info("✓ Model export complete")
+        return exported_model if use_trace else loaded_model
         
     except Exception as e:
         logger.error(f"Model export failed: {e}")
@@ -101,12 +158,13 @@ def export_torchscript_model(output_path: str = "triton_add_model.pt",
         traceback.print_exc()
         raise
 
-def test_exported_model(model_path: str = "triton_add_model.pt") -> bool:
+def test_exported_model(model_path: Optional[str] = None, use_trace: bool = False) -> bool:
     """
     Test an exported model.
     
     Args:
-        model_path: Model file path
+        model_path: Model file path; defaults to the ``export_torchscript_model`` default for the mode
+        use_trace: The model was exported as a TorchScript trace (otherwise AOTInductor)
         
     Returns:
         bool: True if all tests pass
@@ -115,8 +173,10 @@ def test_exported_model(model_path: str = "triton_add_model.pt") -> bool:
     logger = logging.getLogger(__name__)
     
     try:
+        model_path = _resolve_model_path(model_path, use_trace)
         logger.info(f"Loading model: {model_path}")
-        model = torch.jit.load(model_path)
+        device = torch.device("cpu") if use_trace else _export_device()
+        model = _load_exported_model(model_path, device, use_trace)
         
         # Test cases
         test_cases = [
@@ -127,6 +187,7 @@ def test_exported_model(model_path: str = "triton_add_model.pt") -> bool:
         
         for i, (x, y) in enumerate(test_cases):
             logger.info(f"Test case {i+1}...")
+            x, y = x.to(device), y.to(device)
             result = model(x, y)
             expected = x + y
             
@@ -153,7 +214,7 @@ if __name__ == "__main__":
         
         if success:
             print("✓ Model export and validation succeeded!")
-            print("Model is ready for Java applications")
+            print("Model is ready for C++ applications (AOTInductor runner)")
         else:
             print("✗ Model validation failed")
             
@@ -2,14 +2,14 @@
 Triton operator performance testing and validation module.
 """
 
+import functools
 import os
-import time
 import logging
 from typing import Tuple, Dict, Any
 
 import torch
-import numpy as np
-from .add import add, triton_add, pytorch_add
+import triton.testing
+from .add import add, triton_add, pytorch_add, fused_add, make_graphed_add
 
 # Triton profiling output
 os.environ["TRITON_PROFILE_PATH"] = "./triton_profile.json"
@@ -23,13 +23,14 @@ def setup_logging():
     # Reduce Triton log noise
     logging.getLogger("triton").setLevel(logging.WARNING)
 
-def benchmark_add_operations(sizes = None, num_runs: int = 10):
+def benchmark_add_operations(sizes = None):
     """
     Benchmark addition for tensors of various sizes.
     
+    Timings are median CUDA-event times from ``triton.testing.do_bench``.
+    
     Args:
         sizes: List of tensor sizes to test
-        num_runs: Runs per size
         
     Returns:
         Dict: Benchmark results
@@ -60,39 +61,42 @@ def benchmark_add_operations(sizes = None, num_runs: int = 10):
         # Test data
         x = torch.randn(size, device='cuda', dtype=torch.float32)
         y = torch.randn(size, device='cuda', dtype=torch.float32)
+        # Reused output buffer keeps the caching allocator out of the timed region
+        out = torch.empty_like(x)
         
-        # GPU warmup
-        for _ in range(3):
-            _ = triton_add(x, y)
-            _ = pytorch_add(x, y)
-        torch.cuda.synchronize()
-        
-        # Triton timing
-        triton_times = []
-        for _ in range(num_runs):
-            torch.cuda.synchronize()
-            start_time = time.perf_counter()
-            triton_result = triton_add(x, y)
-            torch.cuda.synchronize()
-            end_time = time.perf_counter()
-            triton_times.append(end_time - start_time)
+        # Capture Triton add in a CUDA graph so timing reflects kernel cost, not launch latency
+        graphed_add = make_graphed_add(x.shape, x.dtype, x.device)
+        gx, gy = graphed_add.inputs
+        gx.copy_(x)
+        gy.copy_(y)
         
-        # PyTorch timing
-        pytorch_times = []
-        for _ in range(num_runs):
-            torch.cuda.synchronize()
-            start_time = time.perf_counter()
-            pytorch_result = pytorch_add(x, y)
-            torch.cuda.synchronize()
-            end_time = time.perf_counter()
-            pytorch_times.append(end_time - start_time)
+        # GPU warmup: Triton and PyTorch on separate streams so they overlap
+        main_stream = torch.cuda.current_stream()
+        triton_stream = torch.cuda.Stream()
+        pytorch_stream = torch.cuda.Stream()
+        triton_stream.wait_stream(main_stream)
+        pytorch_stream.wait_stream(main_stream)
+        with torch.cuda.stream(triton_stream):
+            for _ in range(3):
+                _ = graphed_add(gx, gy)
+        with torch.cuda.stream(pytorch_stream):
+            for _ in range(3):
+                _ = pytorch_add(x, y, out=out)
+        main_stream.wait_stream(triton_stream)
+        main_stream.wait_stream(pytorch_stream)
+        main_stream.synchronize()
         
-        # Statistics
-        avg_triton_time = np.mean(triton_times) * 1000  # convert to ms
-        avg_pytorch_time = np.mean(pytorch_times) * 1000
-        speedup = avg_pytorch_time / avg_triton_time if avg_triton_time > 0 else 0
+        # Median kernel time (CUDA events, L2 flushed between runs); sequential on
+        # the current stream to avoid cross-stream interference
+        median_triton_time = triton.testing.do_bench(
+            functools.partial(graphed_add, gx, gy), warmup=25, rep=100, return_mode="median")
+        median_pytorch_time = triton.testing.do_bench(
+            functools.partial(pytorch_add, x, y, out=out), warmup=25, rep=100, return_mode="median")
+        speedup = median_pytorch_time / median_triton_time if median_triton_time > 0 else 0
         
         # Accuracy check
+        triton_result = graphed_add(gx, gy)
+        pytorch_result = pytorch_add(x, y, out=out)
         try:
             accuracy_check = torch.allclose(triton_result, pytorch_result, atol=1e-6)
             if isinstance(triton_result, torch.Tensor) and isinstance(pytorch_result, torch.Tensor):
@@ -103,13 +107,13 @@ def benchmark_add_operations(sizes = None, num_runs: int = 10):
             accuracy_check = False
             max_diff = float('inf')
         
-        results['triton_times'].append(avg_triton_time)
-        results['pytorch_times'].append(avg_pytorch_time)
+        results['triton_times'].append(median_triton_time)
+        results['pytorch_times'].append(median_pytorch_time)
         results['speedup_ratios'].append(speedup)
         results['accuracy_checks'].append(accuracy_check)
         
-        logger.info(f"  Triton time: {avg_triton_time:.3f}ms")
-        logger.info(f"  PyTorch time: {avg_pytorch_time:.3f}ms")
+        logger.info(f"  Triton median time: {median_triton_time:.3f}ms")
+        logger.info(f"  PyTorch median time: {median_pytorch_time:.3f}ms")
         logger.info(f"  Speedup: {speedup:.2f}x")
         logger.info(f"  Accuracy check: {'PASS' if accuracy_check else 'FAIL'}")
         logger.info(f"  Max diff: {max_diff:.2e}")
@@ -153,15 +157,7 @@ def validate_correctness(test_sizes = None) -> bool:
             y = torch.randn(size, device='cuda', dtype=torch.float32)
             
             try:
-                triton_result = triton_add(x, y)
-                pytorch_result = pytorch_add(x, y)
-                expected = x + y
-                
-                # Compare with PyTorch
-                triton_match = torch.allclose(triton_result, pytorch_result, atol=1e-6)
-                expected_match = torch.allclose(triton_result, expected, atol=1e-6)
-                
-                if not (triton_match and expected_match):
+                if not _matches(triton_add(x, y), pytorch_add(x, y)):
                     logger.error(f"Validation failed - size: {size}, test case: {i}")
                     all_passed = False
                 else:
@@ -170,9 +166,157 @@ def validate_correctness(test_sizes = None) -> bool:
             except Exception as e:
                 logger.error(f"Validation error - size: {size}, test case: {i}, error: {e}")
                 all_passed = False
+        
+        # Non-contiguous layouts (strided kernel, and the rank > 4 contiguous fallback)
+        for name, x, y in _layout_cases(size):
+            try:
+                if not _matches(triton_add(x, y), pytorch_add(x, y)):
+                    logger.error(f"Validation failed - size: {size}, layout: {name}")
+                    all_passed = False
+                else:
+                    logger.debug(f"Validation passed - size: {size}, layout: {name}")
+                    
+            except Exception as e:
+                logger.error(f"Validation error - size: {size}, layout: {name}, error: {e}")
+                all_passed = False
+        
+        # fused_add: single input, one full launch, and chained launches (> 4 inputs)
+        for num_inputs in (1, 4, 5, 9):
+            tensors = [torch.randn(size, device='cuda', dtype=torch.float32) for _ in range(num_inputs)]
+            ref = tensors[0].clone()
+            for t in tensors[1:]:
+                ref = pytorch_add(ref, t)
+            
+            try:
+                if not _matches(fused_add(*tensors), ref):
+                    logger.error(f"Validation failed - size: {size}, fused_add inputs: {num_inputs}")
+                    all_passed = False
+                else:
+                    logger.debug(f"Validation passed - size: {size}, fused_add inputs: {num_inputs}")
+                    
+            except Exception as e:
+                logger.error(f"Validation error - size: {size}, fused_add inputs: {num_inputs}, error: {e}")
+                all_passed = False
+        
+        # add(dtype=...): reduced-precision store cast (Triton) and .to(dtype) fallback
+        for name, compute, ref in _dtype_cases(size):
+            try:
+                if not _matches(compute(), ref):
+                    logger.error(f"Validation failed - size: {size}, dtype case: {name}")
+                    all_passed = False
+                else:
+                    logger.debug(f"Validation passed - size: {size}, dtype case: {name}")
+                    
+            except Exception as e:
+                logger.error(f"Validation error - size: {size}, dtype case: {name}, error: {e}")
+                all_passed = False
+    
+    # add(): broadcast-scalar folding, with and without a preallocated out
+    for size in test_sizes:
+        for name, x, y in _scalar_cases(size):
+            for use_out in (False, True):
+                label = f"{name}{'_out' if use_out else ''}"
+                try:
+                    ref = pytorch_add(x, y)
+                    out = torch.empty_like(ref) if use_out else None
+                    if not _matches(add(x, y, out=out), ref):
+                        logger.error(f"Validation failed - size: {size}, scalar case: {label}")
+                        all_passed = False
+                    else:
+                        logger.debug(f"Validation passed - size: {size}, scalar case: {label}")
+                        
+                except Exception as e:
+                    logger.error(f"Validation error - size: {size}, scalar case: {label}, error: {e}")
+                    all_passed = False
+    
+    # add(dtype=...) argument errors
+    x = torch.randn(16, device='cuda', dtype=torch.float32)
+    bad_calls = [
+        ('unsupported_dtype', lambda: add(x, x, dtype=torch.float64)),
+        ('dtype_out_mismatch', lambda: add(x, x, dtype=torch.bfloat16,
+                                           out=torch.empty_like(x, dtype=torch.float16))),
+    ]
+    for name, call in bad_calls:
+        try:
+            call()
+            logger.error(f"Validation failed - {name}: no ValueError raised")
+            all_passed = False
+        except ValueError:
+            logger.debug(f"Validation passed - {name}")
+        except Exception as e:
+            logger.error(f"Validation error - {name}, unexpected error: {e}")
+            all_passed = False
     
     return all_passed
 
+def _matches(result: torch.Tensor, ref: torch.Tensor) -> bool:
+    """
+    Compare with PyTorch: one reduction and a single host sync.
+    
+    fp32 results must agree to 1e-6; bf16/fp16 results to one ulp of ``ref``'s dtype.
+    """
+    if result.shape != ref.shape or result.dtype != ref.dtype:
+        return False
+    if ref.dtype in (torch.bfloat16, torch.float16):
+        eps = torch.finfo(ref.dtype).eps
+        err = (result.float() - ref.float()).abs() - eps * ref.float().abs()
+        return bool((err.max() <= eps).item())
+    max_err = (result - ref).abs().max()
+    return bool((max_err <= 1e-6).item())
+
+def _layout_cases(size: int):
+    """Non-contiguous (name, x, y) input pairs of roughly ``size`` elements."""
+    def randn(*shape):
+        return torch.randn(*shape, device='cuda', dtype=torch.float32)
+    
+    cols = 8
+    rows = max(1, size // cols)
+    inner = max(1, size // 16)
+    return [
+        # Transposed 2-D view against a contiguous tensor
+        ('transposed', randn(cols, rows).t(), randn(rows, cols)),
+        # Stepped slice
+        ('stepped_slice', randn(2 * size)[::2], randn(size)),
+        # Stride-0 broadcast passed straight to triton_add
+        ('expand', randn(1).expand(size), randn(size)),
+        # Rank 5 exceeds the strided kernel and takes the .contiguous() fallback
+        ('rank5', randn(inner, 2, 2, 2, 2).transpose(0, 4), randn(2, 2, 2, 2, inner)),
+    ]
+
+def _scalar_cases(size: int):
+    """(name, x, y) pairs where one operand holds a single value, for ``add()``."""
+    def randn(*shape):
+        return torch.randn(*shape, device='cuda', dtype=torch.float32)
+    
+    return [
+        # Stride-0 expand as either operand
+        ('expand_x', randn(1).expand(size), randn(size)),
+        ('expand_y', randn(size), randn(1).expand(size)),
+        # Aliased view with strides (1, 0)
+        ('expand_2d', randn(1, 1).expand(1, size), randn(1, size)),
+        # One-element tensor broadcast against a full one
+        ('one_element', randn(1), randn(size)),
+    ]
+
+def _dtype_cases(size: int):
+    """(name, compute, ref) cases for ``add(dtype=...)``; ``compute`` is called lazily."""
+    x = torch.randn(size, device='cuda', dtype=torch.float32)
+    y = torch.randn(size, device='cuda', dtype=torch.float32)
+    cases = []
+    for dtype in (torch.bfloat16, torch.float16):
+        name = str(dtype).replace('torch.', '')
+        xd, yd = x.to(dtype), y.to(dtype)
+        cases += [
+            # fp32 inputs, rounded on store by the Triton kernel
+            (f'{name}_from_fp32', functools.partial(add, x, y, dtype=dtype), (x + y).to(dtype)),
+            # Reduced-precision inputs end to end
+            (f'{name}_inputs', functools.partial(add, xd, yd, dtype=dtype), xd + yd),
+            # PyTorch fallback path: result.to(dtype)
+            (f'{name}_fallback', functools.partial(add, x, y, use_triton=False, dtype=dtype),
+             (x + y).to(dtype)),
+        ]
+    return cases
+
 def print_system_info():
     """Print system information."""
     import torch